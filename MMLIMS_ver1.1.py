@@ -1,14 +1,13 @@
 # app.py
-import os
 import sqlite3
-import pandas as pd
+import threading
 import streamlit as st
-import altair as alt
 
-
-from load_chronect import start_chronect_watcher
 from tray_assignment  import assign_rack_to_ready_vials
-from init_db import init_db, get_connection
+from init_db import ensure_schema
+from barcode_index import BarcodeIndex
+from archive import read_master, archive_completed, ARCHIVE_AFTER_DAYS
+from rack_reconcile import read_scan_exports, reconcile, summarize, apply_corrections
 
 # config
 DB_PATH = st.secrets["database"]["STREAMLIT_DB"]
@@ -21,30 +20,31 @@ INPUT_DIR = st.secrets["dropbox"]["INPUT_DIR"]
 def get_connection():
     return sqlite3.connect(DB_PATH, check_same_thread=False)
 
-import load_chronect
-load_chronect.DB_PATH = DB_PATH
-load_chronect.INPUT_DIR = INPUT_DIR
-load_chronect.init_db()
-# do an initial bulk load
-load_chronect.load_all_chronect_files()
-# start the background watcher thread
-load_chronect.start_chronect_watcher()
-
-def get_master_df():
-    sql = """
-    SELECT
-      cd.Barcode, cd.Tray, cd.Vial, cd.VialPosition, cd.SampleID, cd.UserID,
-      cd.SubstanceName, cd.Head, cd.LotID, cd.TargetWeight, cd.ActualWeight,
-      cd.Outcome, cd.DeviationPercent, cd.Date, cd.Time, cd.DispenseDuration,
-      cd.ErrorMessage, cd.StableWeight, cd.Timestamp, cd.SourceFile,
-      inv.Status, inv.Source AS FactSource,
-      hd.RackID, hd.Row, hd.Column
-    FROM inventory_fact inv
-    LEFT JOIN chronect_data cd ON inv.Barcode = cd.Barcode
-    LEFT JOIN hamilton_data hd ON cd.Barcode = hd.Barcode
-    """
+# Streamlit re-executes this script on every interaction; everything here
+# runs once per server process instead.
+@st.cache_resource
+def startup():
+    ensure_schema(get_connection())
+    import load_chronect
+    load_chronect.DB_PATH = DB_PATH
+    load_chronect.INPUT_DIR = INPUT_DIR
+
+    def initial_load():
+        try:
+            load_chronect.load_all_chronect_files()
+        except Exception as e:
+            print("❌ Initial CHRONECT load failed:", e)
+
+    # do the initial bulk load off the render path
+    threading.Thread(target=initial_load, name="chronect-initial-load", daemon=True).start()
+    # start the background watcher thread
+    return load_chronect.start_chronect_watcher()
+
+startup()
+
+def get_master_df(include_archived=False):
     conn = get_connection()
-    return pd.read_sql(sql, conn)
+    return read_master(conn, include_archived)
 
 def update_status(barcodes, new_status):
     conn = get_connection()
@@ -55,14 +55,35 @@ def update_status(barcodes, new_status):
     )
     conn.commit()
 
-# # 2️⃣ start the background folder watcher
-# start_chronect_watcher()
+# in-memory barcode index, refreshed from write_log (and the log pruned)
+# once per rerun below, and again before a scan so it sees this run's writes
+@st.cache_resource
+def get_barcode_index():
+    return BarcodeIndex.build(get_connection())
+
+def scan_lookup(barcodes):
+    index = get_barcode_index()
+    index.refresh(get_connection())
+    return index.lookup_df(barcodes)
+
+get_barcode_index().refresh(get_connection())
 
 # 2) Build UI
 st.set_page_config("MML Lab Inventory", layout="wide")
 st.title("🧪 MML Lab Inventory Management System")
 
-master_df = get_master_df()
+# hot/cold tiering: Completed vials past the cutoff live in the archive db
+with st.sidebar:
+    st.header("🗄️ Archive")
+    include_archived = st.checkbox("Include archived vials", value=False)
+    archive_days = st.number_input(
+        "Archive Completed vials older than (days)", min_value=1, value=ARCHIVE_AFTER_DAYS
+    )
+    if st.button("Archive now"):
+        counts = archive_completed(get_connection(), archive_days)
+        st.success(f"Archived {sum(counts.values())} vials.")
+
+master_df = get_master_df(include_archived)
 
 st.subheader("📋 Master Inventory Table")
 st.dataframe(master_df, use_container_width=True)
@@ -76,12 +97,23 @@ if st.button("➕ Add All Ready Vials"):
         "In Fridge"
     )
 
+# 3b) Scan lookup
+st.subheader("🔎 Scan Barcodes")
+scanned = st.text_area("Scan or paste barcodes (one per line)", key="scanned")
+if scanned.strip():
+    scan_df = scan_lookup([b.strip() for b in scanned.splitlines() if b.strip()])
+    st.dataframe(scan_df, use_container_width=True)
+    missing = int((~scan_df.Found).sum())
+    if missing:
+        st.warning(f"{missing} scanned barcodes are not in the inventory.")
+
 # 4) In-Fridge Chart
 st.subheader("📊 Vials In-Fridge by Substance")
 fridge = master_df[master_df.Status == "In Fridge"]
 if fridge.empty:
     st.write("No vials currently “In Fridge.”")
 else:
+    import altair as alt
     counts = (
         fridge.SubstanceName.value_counts()
         .rename_axis("SubstanceName")
@@ -113,6 +145,29 @@ if st.button("📤 Download Rack CSV"):
     )
     st.session_state["last_downloaded"] = rack_df.Barcode.tolist()
 
+# 5b) Reconcile rack scans against recorded layout
+st.subheader("🧮 Reconcile Rack Scans")
+scan_files = st.file_uploader(
+    "Upload rack-scanner exports (CSV, one or many racks)",
+    type="csv", accept_multiple_files=True, key="rack_scans"
+)
+if scan_files:
+    try:
+        report = reconcile(get_connection(), read_scan_exports(scan_files))
+    except ValueError as e:
+        st.error(str(e))
+    else:
+        st.dataframe(summarize(report), use_container_width=True)
+        issues = report[report.Issue != "ok"]
+        if issues.empty:
+            st.success("All scanned racks match the recorded layout.")
+        else:
+            st.dataframe(issues, use_container_width=True)
+            remove_missing = st.checkbox("Also remove missing vials from their recorded racks")
+            if st.button("🛠️ Apply Corrections"):
+                counts = apply_corrections(get_connection(), report, remove_missing=remove_missing)
+                st.success(f"Corrections applied: {counts}")
+
 # 6) Retrieve by Substance (FIFO)
 st.subheader("🔬 Retrieve by Substance & Count (FIFO)")
 subs_opts = sorted(master_df.SubstanceName.dropna().unique())
@@ -0,0 +1,135 @@
+import os
+import sys
+import sqlite3
+import pandas as pd
+
+from init_db import ensure_schema
+
+ARCHIVE_AFTER_DAYS = 90
+ARCHIVE_SCHEMA = "archive"
+
+MASTER_COLUMNS = """
+      cd.Barcode, cd.Tray, cd.Vial, cd.VialPosition, cd.SampleID, cd.UserID,
+      cd.SubstanceName, cd.Head, cd.LotID, cd.TargetWeight, cd.ActualWeight,
+      cd.Outcome, cd.DeviationPercent, cd.Date, cd.Time, cd.DispenseDuration,
+      cd.ErrorMessage, cd.StableWeight, cd.Timestamp, cd.SourceFile,
+      inv.Status, inv.Source AS FactSource,
+      hd.RackID, hd.Row, hd.Column
+"""
+MASTER_FROM = """
+    FROM inventory_fact inv
+    LEFT JOIN chronect_data cd ON inv.Barcode = cd.Barcode
+    LEFT JOIN hamilton_data hd ON cd.Barcode = hd.Barcode
+"""
+MASTER_SQL = f"SELECT {MASTER_COLUMNS} {MASTER_FROM}"
+ARCHIVE_COLUMNS = (
+    "Barcode, Tray, Vial, VialPosition, SampleID, UserID, SubstanceName, Head, "
+    "LotID, TargetWeight, ActualWeight, Outcome, DeviationPercent, Date, Time, "
+    "DispenseDuration, ErrorMessage, StableWeight, Timestamp, SourceFile, "
+    "Status, FactSource, RackID, Row, Column"
+)
+
+
+def archive_path_for(conn):
+    """Cold-tier file next to the main database, e.g. lab_inventory_archive.db."""
+    main = next(r[2] for r in conn.execute("PRAGMA database_list") if r[1] == "main")
+    if not main:
+        raise ValueError("❌ In-memory database: pass archive_path explicitly.")
+    return os.path.splitext(main)[0] + "_archive.db"
+
+
+def attach_archive(conn, archive_path=None):
+    """ATTACH the archive database (once per connection) and return its path."""
+    attached = {r[1]: r[2] for r in conn.execute("PRAGMA database_list")}
+    if ARCHIVE_SCHEMA in attached:
+        return attached[ARCHIVE_SCHEMA]
+    archive_path = archive_path or archive_path_for(conn)
+    conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (archive_path,))
+    return archive_path
+
+
+def archive_tables(conn):
+    """Monthly archive tables (vials_YYYY_MM), oldest first."""
+    return [r[0] for r in conn.execute(f"""
+        SELECT name FROM {ARCHIVE_SCHEMA}.sqlite_master
+        WHERE type = 'table' AND name LIKE 'vials_%'
+        ORDER BY name
+    """)]
+
+
+def archive_completed(conn, older_than_days=ARCHIVE_AFTER_DAYS, archive_path=None):
+    """Move Completed vials dispensed more than *older_than_days* ago to the archive.
+
+    Each vial's full master row (chronect + status + last rack position) is
+    copied into the monthly table for its dispense Timestamp, then deleted
+    from inventory_fact, hamilton_data and chronect_data. The barcode is
+    also tombstoned in archived_barcodes so a later re-ingest skips it.
+    Everything runs in one transaction across both database files.
+    Returns a dict of month -> number of vials archived.
+    """
+    ensure_schema(conn)
+    attach_archive(conn, archive_path)
+    cutoff = f"-{int(older_than_days)} days"
+    cur = conn.cursor()
+    cur.execute("DROP TABLE IF EXISTS temp.to_archive")
+    cur.execute(f"""
+        CREATE TEMP TABLE to_archive AS
+        SELECT {MASTER_COLUMNS}, substr(cd.Timestamp, 1, 7) AS Month
+        {MASTER_FROM}
+        WHERE inv.Status = 'Completed'
+          AND cd.Timestamp IS NOT NULL
+          AND cd.Timestamp < datetime('now', ?)
+    """, (cutoff,))
+    months = [r[0] for r in cur.execute(
+        "SELECT DISTINCT Month FROM temp.to_archive ORDER BY Month"
+    ).fetchall()]
+    counts = {}
+    try:
+        cur.execute("BEGIN")
+        for month in months:
+            name = f"vials_{month.replace('-', '_')}"
+            table = f"{ARCHIVE_SCHEMA}.{name}"
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} AS
+                SELECT {ARCHIVE_COLUMNS} FROM temp.to_archive WHERE 0
+            """)
+            cur.execute(f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_{name}_barcode ON {name}(Barcode)")
+            cur.execute(f"""
+                INSERT INTO {table} ({ARCHIVE_COLUMNS})
+                SELECT {ARCHIVE_COLUMNS} FROM temp.to_archive WHERE Month = ?
+            """, (month,))
+            counts[month] = cur.rowcount
+        cur.execute("INSERT OR IGNORE INTO archived_barcodes (Barcode) SELECT Barcode FROM temp.to_archive")
+        for hot in ("inventory_fact", "hamilton_data", "chronect_data"):
+            cur.execute(f"DELETE FROM {hot} WHERE Barcode IN (SELECT Barcode FROM temp.to_archive)")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.execute("DROP TABLE IF EXISTS temp.to_archive")
+    if counts:
+        print(f"🗄️ Archived {sum(counts.values())} Completed vials: {counts}")
+    return counts
+
+
+def master_sql(conn, include_archived=False):
+    """Master inventory query, optionally UNION ALL'd with every archive month."""
+    if not include_archived:
+        return MASTER_SQL
+    attach_archive(conn)
+    parts = [f"SELECT {ARCHIVE_COLUMNS} FROM ({MASTER_SQL})"]
+    parts += [f"SELECT {ARCHIVE_COLUMNS} FROM {ARCHIVE_SCHEMA}.{t}" for t in archive_tables(conn)]
+    return "\nUNION ALL\n".join(parts)
+
+
+def read_master(conn, include_archived=False):
+    return pd.read_sql(master_sql(conn, include_archived), conn)
+
+
+if __name__ == "__main__":
+    from init_db import DB_PATH
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else ARCHIVE_AFTER_DAYS
+    conn = sqlite3.connect(DB_PATH)
+    archive_completed(conn, days)
+    conn.close()
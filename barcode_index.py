@@ -0,0 +1,247 @@
+import re
+import threading
+import numpy as np
+import pandas as pd
+
+from init_db import create_write_log
+
+# FS06527278 -> 8 digits. The digit count is folded into the key so that
+# "FS0123" and "FS123" never collide.
+BARCODE_RE = re.compile(r"^FS(\d{1,15})$")
+DIGIT_SHIFT = 10 ** 15
+ROWS = "ABCDEFGH"
+MISSING = -1
+
+INDEX_SQL = """
+    SELECT inv.Barcode, inv.Status, hd.RackID, hd.Row, hd.Column
+    FROM inventory_fact inv
+    LEFT JOIN hamilton_data hd ON inv.Barcode = hd.Barcode
+"""
+
+
+def encode_barcode(barcode):
+    """Return the integer key for an FS-prefixed barcode, or -1 if it is not one."""
+    m = BARCODE_RE.match(str(barcode).strip()) if barcode is not None else None
+    if m is None:
+        return MISSING
+    digits = m.group(1)
+    return len(digits) * DIGIT_SHIFT + int(digits)
+
+
+def encode_barcodes(barcodes):
+    """Vectorized encode_barcode for a batch of barcodes."""
+    barcodes = list(barcodes)
+    keys = np.full(len(barcodes), MISSING, dtype=np.int64)
+    a = np.asarray([b if isinstance(b, str) else "" for b in barcodes], dtype=str)
+    width = a.dtype.itemsize // 4
+    ok = np.zeros(len(barcodes), dtype=bool)
+    if len(a) and 3 <= width <= 17:
+        # Fast path for "FS" + digits at the batch's widest width: view the
+        # UTF-32 code points as a (n, width) matrix and do the maths on that.
+        codes = a.view(np.uint32).reshape(len(a), width).astype(np.int64)
+        digits = codes[:, 2:] - ord("0")
+        ok = (codes[:, 0] == ord("F")) & (codes[:, 1] == ord("S")) & ((digits >= 0) & (digits <= 9)).all(axis=1)
+        powers = 10 ** np.arange(width - 3, -1, -1, dtype=np.int64)
+        keys[ok] = (width - 2) * DIGIT_SHIFT + digits[ok] @ powers
+    # anything else (shorter, padded, None, ...) goes through the regex
+    for i in np.flatnonzero(~ok):
+        keys[i] = encode_barcode(barcodes[i])
+    return keys
+
+
+def _log_seq(cur):
+    """Last Seq handed out by write_log, even if those rows were pruned."""
+    row = cur.execute("SELECT seq FROM sqlite_sequence WHERE name = 'write_log'").fetchone()
+    return row[0] if row else 0
+
+
+def _take(arr, pos, found):
+    if not len(arr):
+        return np.full(len(pos), MISSING)
+    return np.where(found, arr[pos], MISSING)
+
+
+class BarcodeIndex:
+    """Sorted NumPy arrays keyed on encoded barcode for scan-time lookups.
+
+    Status is stored as a code into ``self.statuses``; Row as a code into
+    ROWS. Missing rack positions are -1. Barcodes that are not FS-prefixed
+    are kept in a small dict so they still resolve.
+
+    One instance is shared by every Streamlit session thread, so refreshes
+    and lookups both hold ``self.lock``.
+    """
+
+    def __init__(self):
+        self.keys = np.empty(0, dtype=np.int64)
+        self.status = np.empty(0, dtype=np.int16)
+        self.rack = np.empty(0, dtype=np.int32)
+        self.row = np.empty(0, dtype=np.int8)
+        self.col = np.empty(0, dtype=np.int8)
+        self.statuses = []
+        self.other = {}
+        self.last_seq = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys) + len(self.other)
+
+    @classmethod
+    def build(cls, conn):
+        """Build a full index from the database."""
+        index = cls()
+        cur = conn.cursor()
+        create_write_log(cur)
+        conn.commit()
+        index.last_seq = _log_seq(cur)
+        index._merge(cur.execute(INDEX_SQL).fetchall(), removed=())
+        return index
+
+    def refresh(self, conn, prune=True):
+        """Apply changes recorded in write_log since the last build/refresh.
+
+        With *prune*, log rows up to the refreshed Seq are deleted afterwards
+        so write_log stays small. If another consumer already pruned rows this
+        index never saw, it falls back to a full rebuild.
+        Returns the number of barcodes that were re-read.
+        """
+        cur = conn.cursor()
+        max_seq = _log_seq(cur)
+        if max_seq <= self.last_seq:
+            return 0
+        min_seq = cur.execute("SELECT MIN(Seq) FROM write_log").fetchone()[0]
+        if min_seq is None or min_seq > self.last_seq + 1:
+            fresh = BarcodeIndex.build(conn)
+            with self.lock:
+                self.keys, self.status, self.rack, self.row, self.col = (
+                    fresh.keys, fresh.status, fresh.rack, fresh.row, fresh.col)
+                self.statuses, self.other = fresh.statuses, fresh.other
+                self.last_seq = fresh.last_seq
+            if prune:
+                self.prune_log(conn)
+            return len(fresh)
+
+        changed = [r[0] for r in cur.execute(
+            "SELECT DISTINCT Barcode FROM write_log WHERE Seq > ? AND Seq <= ?",
+            (self.last_seq, max_seq)
+        ).fetchall()]
+        rows = []
+        # stay under SQLite's bound-parameter limit
+        for i in range(0, len(changed), 500):
+            chunk = changed[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows += cur.execute(
+                INDEX_SQL + f" WHERE inv.Barcode IN ({placeholders})", chunk
+            ).fetchall()
+        with self.lock:
+            self._merge(rows, removed=changed)
+            self.last_seq = max_seq
+        if prune:
+            self.prune_log(conn)
+        return len(changed)
+
+    def prune_log(self, conn):
+        """Delete write_log rows this index has already applied."""
+        conn.execute("DELETE FROM write_log WHERE Seq <= ?", (self.last_seq,))
+        conn.commit()
+
+    def _status_code(self, status):
+        if status is None:
+            return MISSING
+        try:
+            return self.statuses.index(status)
+        except ValueError:
+            self.statuses.append(status)
+            return len(self.statuses) - 1
+
+    def _merge(self, rows, removed):
+        """Drop *removed* barcodes, then insert/overwrite *rows*."""
+        for bc in removed:
+            self.other.pop(bc, None)
+        drop = encode_barcodes(removed)
+        keep = ~np.isin(self.keys, drop) if len(drop) else np.ones(len(self.keys), dtype=bool)
+
+        new_keys, new_status, new_rack, new_row, new_col = [], [], [], [], []
+        for barcode, status, rack, row, col in rows:
+            if barcode is None:
+                continue
+            code = self._status_code(status)
+            rack = MISSING if rack is None else int(rack)
+            row = ROWS.find(row) if row else MISSING
+            col = MISSING if col is None else int(col)
+            key = encode_barcode(barcode)
+            if key == MISSING:
+                self.other[barcode] = (code, rack, row, col)
+                continue
+            new_keys.append(key)
+            new_status.append(code)
+            new_rack.append(rack)
+            new_row.append(row)
+            new_col.append(col)
+
+        keys = np.concatenate([self.keys[keep], np.asarray(new_keys, dtype=np.int64)])
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.status = np.concatenate([self.status[keep], np.asarray(new_status, dtype=np.int16)])[order]
+        self.rack = np.concatenate([self.rack[keep], np.asarray(new_rack, dtype=np.int32)])[order]
+        self.row = np.concatenate([self.row[keep], np.asarray(new_row, dtype=np.int8)])[order]
+        self.col = np.concatenate([self.col[keep], np.asarray(new_col, dtype=np.int8)])[order]
+
+    def positions(self, barcodes):
+        """Return (positions, found) arrays for *barcodes* into the sorted arrays.
+
+        Callers outside this class should hold ``self.lock``.
+        """
+        q = encode_barcodes(barcodes)
+        if not len(self.keys):
+            return np.zeros(len(q), dtype=np.intp), np.zeros(len(q), dtype=bool)
+        pos = np.searchsorted(self.keys, q)
+        pos[pos == len(self.keys)] = 0
+        return pos, (self.keys[pos] == q) & (q != MISSING)
+
+    def lookup(self, barcodes):
+        """Bulk lookup of scanned barcodes.
+
+        Returns a dict of equal-length NumPy arrays: Found, Status, RackID,
+        Row and Column. Unknown barcodes get Found=False, Status=None and -1 /
+        "" for position fields.
+        """
+        barcodes = list(barcodes)
+        with self.lock:
+            pos, found = self.positions(barcodes)
+            status = _take(self.status, pos, found)
+            rack = _take(self.rack, pos, found)
+            row = _take(self.row, pos, found)
+            col = _take(self.col, pos, found)
+
+            if self.other:
+                for i, bc in enumerate(barcodes):
+                    if bc in self.other:
+                        found[i] = True
+                        status[i], rack[i], row[i], col[i] = self.other[bc]
+
+            labels = np.array(self.statuses + [None], dtype=object)
+        row_labels = np.array(list(ROWS) + [""], dtype=object)
+        return {
+            "Barcode": np.array(barcodes, dtype=object),
+            "Found": found,
+            "Status": labels[status],
+            "RackID": rack,
+            "Row": row_labels[row],
+            "Column": col,
+        }
+
+    def lookup_df(self, barcodes):
+        return pd.DataFrame(self.lookup(barcodes))
+
+    def verify_rack(self, rack_id, barcodes):
+        """Return a boolean array: is each scanned barcode recorded in *rack_id*?"""
+        barcodes = list(barcodes)
+        with self.lock:
+            pos, found = self.positions(barcodes)
+            ok = found & (_take(self.rack, pos, found) == int(rack_id))
+            if self.other:
+                for i, bc in enumerate(barcodes):
+                    if bc in self.other:
+                        ok[i] = self.other[bc][1] == int(rack_id)
+        return ok
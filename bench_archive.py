@@ -0,0 +1,110 @@
+"""Hot-path master query time as Completed history grows, with and without archiving.
+
+Builds throwaway databases in a temp folder: a fixed hot set of Ready /
+In Fridge vials plus 1x, 10x and 100x as many old Completed vials. Finally
+checks that replaying archived vials through the CHRONECT ingest does not
+bring them back into the hot tables.
+
+    python bench_archive.py [hot_vials] [base_history]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import timeit
+
+import archive
+
+ROWS = "ABCDEFGH"
+
+
+def build_db(path, hot, history):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+    CREATE TABLE chronect_data (
+      Barcode TEXT PRIMARY KEY, Tray TEXT, Vial TEXT, VialPosition TEXT,
+      SampleID TEXT, UserID TEXT, SubstanceName TEXT, Head TEXT, LotID TEXT,
+      TargetWeight REAL, ActualWeight REAL, Outcome TEXT, DeviationPercent REAL,
+      Date TEXT, Time TEXT, DispenseDuration INTEGER, ErrorMessage TEXT,
+      StableWeight INTEGER, Timestamp TEXT, SourceFile TEXT);
+    CREATE TABLE hamilton_data (
+      Barcode TEXT PRIMARY KEY, RackID INTEGER, Row TEXT, Column INTEGER, SourceFile TEXT);
+    CREATE TABLE inventory_fact (
+      Barcode TEXT PRIMARY KEY, Status TEXT, Source TEXT);
+    """)
+    total = hot + history
+    chronect, layout, fact = [], [], []
+    for i in range(total):
+        bc = f"FS{i:08d}"
+        old = i >= hot
+        # history spread over ~2 years, all well past the archive cutoff
+        ts = f"20{22 + (i % 24) // 12}-{(i % 12) + 1:02d}-15 12:00:00" if old else "2099-01-01 12:00:00"
+        chronect.append((bc, "Tray1", str(i % 96), "A1", f"Sub{i % 40}", 3.0, 3.1, "Ok", ts, "bench.xlsx"))
+        layout.append((bc, i // 96 + 1, ROWS[(i % 96) // 12], i % 12 + 1))
+        fact.append((bc, "Completed" if old else ("In Fridge" if i % 2 else "Ready")))
+    conn.executemany(
+        "INSERT INTO chronect_data (Barcode, Tray, Vial, VialPosition, SubstanceName, "
+        "TargetWeight, ActualWeight, Outcome, Timestamp, SourceFile) VALUES (?,?,?,?,?,?,?,?,?,?)",
+        chronect)
+    conn.executemany("INSERT INTO hamilton_data (Barcode, RackID, Row, Column) VALUES (?,?,?,?)", layout)
+    conn.executemany("INSERT INTO inventory_fact (Barcode, Status, Source) VALUES (?, ?, 'BENCH')", fact)
+    conn.commit()
+    return conn
+
+
+def hot_query_time(conn):
+    return min(timeit.repeat(lambda: archive.read_master(conn), number=3, repeat=3)) / 3
+
+
+def check_replay(tmp, hot, history):
+    """Archive, then re-ingest the archived rows; none may come back."""
+    path = os.path.join(tmp, "replay.db")
+    conn = build_db(path, hot, history)
+    archive.archive_completed(conn, 90)
+    hot_before = conn.execute("SELECT COUNT(*) FROM inventory_fact").fetchone()[0]
+    replay = archive.read_master(conn, include_archived=True)
+    replay = replay[replay.Status == "Completed"]
+
+    # load_chronect reads st.secrets at import; give it a throwaway config
+    os.makedirs(os.path.join(tmp, ".streamlit"), exist_ok=True)
+    with open(os.path.join(tmp, ".streamlit", "secrets.toml"), "w") as f:
+        f.write(f'[database]\nSTREAMLIT_DB = "{path}"\n'
+                f'[dropbox]\nDBX_TOKEN = ""\nINPUT_DIR = "{tmp}"\n')
+    cwd = os.getcwd()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(tmp)
+    try:
+        import load_chronect
+        load_chronect.insert_into_database(replay, conn)
+    finally:
+        os.chdir(cwd)
+
+    hot_after = conn.execute("SELECT COUNT(*) FROM inventory_fact").fetchone()[0]
+    total = len(archive.read_master(conn, include_archived=True))
+    conn.close()
+    ok = hot_after == hot_before and total == hot + history
+    print(f"{'✅' if ok else '❌'} replay of {len(replay)} archived vials: "
+          f"hot {hot_before} -> {hot_after}, hot+archive {total}")
+    return ok
+
+
+def main(argv):
+    hot = int(argv[0]) if argv else 2000
+    base = int(argv[1]) if len(argv) > 1 else 1000
+    print(f"🔥 {hot} hot vials, Completed history = {base} x factor")
+    print(f"  {'factor':>6} {'history':>8} {'no archive':>12} {'archived':>10} {'archive run':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for factor in (1, 10, 100):
+            path = os.path.join(tmp, f"bench_{factor}.db")
+            conn = build_db(path, hot, base * factor)
+            before = hot_query_time(conn)
+            run = timeit.timeit(lambda: archive.archive_completed(conn, 90), number=1)
+            after = hot_query_time(conn)
+            print(f"  {factor:>5}x {base * factor:>8} {before * 1e3:>10.1f}ms {after * 1e3:>8.1f}ms {run * 1e3:>10.1f}ms")
+            conn.close()
+        if not check_replay(tmp, hot, base):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
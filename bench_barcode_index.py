@@ -0,0 +1,108 @@
+"""Compare scan-time barcode lookups: SQL vs pandas vs BarcodeIndex.
+
+Works on an in-memory copy of the database so nothing on disk is touched.
+
+    python bench_barcode_index.py [db_path] [--synthetic N]
+"""
+import sqlite3
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from barcode_index import BarcodeIndex
+from init_db import create_write_log
+
+MASTER_SQL = """
+    SELECT inv.Barcode, inv.Status, hd.RackID, hd.Row, hd.Column
+    FROM inventory_fact inv
+    LEFT JOIN hamilton_data hd ON inv.Barcode = hd.Barcode
+"""
+
+
+def load_memory_copy(db_path):
+    disk = sqlite3.connect(db_path)
+    mem = sqlite3.connect(":memory:")
+    disk.backup(mem)
+    disk.close()
+    return mem
+
+
+def add_synthetic_vials(conn, n):
+    """Pad the database with *n* racked vials so lookups run against a larger table."""
+    rows = "ABCDEFGH"
+    start = 90000000
+    conn.executemany(
+        "INSERT OR IGNORE INTO inventory_fact (Barcode, Status, Source) VALUES (?, 'In Fridge', 'SYNTH')",
+        [(f"FS{start + i:08d}",) for i in range(n)]
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO hamilton_data (Barcode, RackID, Row, Column, SourceFile) VALUES (?, ?, ?, ?, NULL)",
+        [(f"FS{start + i:08d}", 1000 + i // 96, rows[(i % 96) // 12], i % 12 + 1) for i in range(n)]
+    )
+    conn.commit()
+
+
+def best_of(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number
+
+
+def main(argv):
+    db_path = "lab_inventory.db"
+    synthetic = 0
+    args = list(argv)
+    if "--synthetic" in args:
+        i = args.index("--synthetic")
+        synthetic = int(args[i + 1])
+        del args[i:i + 2]
+    if args:
+        db_path = args[0]
+
+    conn = load_memory_copy(db_path)
+    create_write_log(conn.cursor())
+    if synthetic:
+        add_synthetic_vials(conn, synthetic)
+
+    all_barcodes = [r[0] for r in conn.execute("SELECT Barcode FROM inventory_fact WHERE Barcode IS NOT NULL")]
+    rng = np.random.default_rng(0)
+    scan = [str(b) for b in rng.choice(all_barcodes, size=min(96, len(all_barcodes)), replace=False)]
+    print(f"📦 {len(all_barcodes)} vials indexed, scanning a {len(scan)}-vial rack")
+
+    def sql_lookup():
+        placeholders = ",".join("?" * len(scan))
+        return conn.execute(MASTER_SQL + f" WHERE inv.Barcode IN ({placeholders})", scan).fetchall()
+
+    master_df = pd.read_sql(MASTER_SQL, conn)
+
+    def pandas_lookup():
+        return master_df[master_df.Barcode.isin(scan)]
+
+    def reload_and_filter():
+        df = pd.read_sql(MASTER_SQL, conn)
+        return df[df.Barcode.isin(scan)]
+
+    build_t = best_of(lambda: BarcodeIndex.build(conn), 3)
+    index = BarcodeIndex.build(conn)
+    rack_id = int(index.lookup(scan[:1])["RackID"][0])
+
+    results = [
+        ("reload master + pandas filter", best_of(reload_and_filter, 20)),
+        ("SQL IN (...)", best_of(sql_lookup, 200)),
+        ("pandas isin on cached df", best_of(pandas_lookup, 200)),
+        ("BarcodeIndex.lookup", best_of(lambda: index.lookup(scan), 2000)),
+        ("BarcodeIndex.verify_rack", best_of(lambda: index.verify_rack(rack_id, scan), 2000)),
+    ]
+    print(f"🔧 index build: {build_t * 1e3:.2f} ms")
+    for name, t in results:
+        print(f"  {name:<32} {t * 1e6:10.1f} µs")
+
+    # incremental refresh after a rack move
+    conn.executemany("UPDATE inventory_fact SET Status = 'In Fridge' WHERE Barcode = ?",
+                     [(bc,) for bc in scan])
+    refresh_t = timeit.timeit(lambda: index.refresh(conn), number=1)
+    print(f"🔁 refresh after {len(scan)} status updates: {refresh_t * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,79 @@
+"""Import-time and first-render benchmark for the Streamlit app.
+
+1. ``python -X importtime`` per heavy module, and for the modules the app
+   imports at startup.
+2. Time to first render and to a rerun, using Streamlit's AppTest against a
+   throwaway copy of the database (Dropbox sync runs in the background and
+   is expected to fail without a real token).
+
+    python bench_startup.py [db_path]
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HEAVY = ["pandas", "numpy", "altair", "dropbox", "watchdog.observers", "streamlit"]
+# what the app imports before first render, vs. what it used to pull in eagerly
+APP_IMPORTS = "import streamlit, tray_assignment, init_db, barcode_index, archive, rack_reconcile"
+EAGER_IMPORTS = APP_IMPORTS + ", altair, dropbox, watchdog.observers"
+APP_FILE = "MMLIMS_ver1.1.py"
+
+
+def import_time(stmt, cwd=None):
+    """Cumulative import time in ms for *stmt* in a fresh interpreter."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", stmt],
+        capture_output=True, text=True, cwd=cwd
+    )
+    total = 0
+    for line in out.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"; top-level
+        # packages are the lines whose name is not indented
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit() and not parts[2].startswith("  "):
+            total += int(parts[1])
+    return total / 1e3
+
+
+def first_render(db_path):
+    from streamlit.testing.v1 import AppTest
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        db_copy = os.path.join(tmp, "bench.db")
+        shutil.copy(db_path, db_copy)
+        inbox = os.path.join(tmp, "in")
+        os.mkdir(inbox)
+
+        at = AppTest.from_file(os.path.join(here, APP_FILE), default_timeout=60)
+        at.secrets["database"] = {"STREAMLIT_DB": db_copy}
+        at.secrets["dropbox"] = {"DBX_TOKEN": "bench", "INPUT_DIR": inbox}
+        t0 = time.perf_counter()
+        at.run()
+        first = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        at.run()
+        rerun = time.perf_counter() - t0
+        if at.exception:
+            print("❌ App raised:", at.exception[0].message)
+    return first, rerun
+
+
+def main(argv):
+    db_path = argv[0] if argv else "lab_inventory.db"
+    here = os.path.dirname(os.path.abspath(__file__))
+    print("⏱️ python -X importtime (cumulative, fresh interpreter)")
+    for mod in HEAVY:
+        print(f"  {mod:<22} {import_time(f'import {mod}'):8.1f} ms")
+    print(f"  {'app startup (lazy)':<22} {import_time(APP_IMPORTS, cwd=here):8.1f} ms")
+    print(f"  {'app startup (eager)':<22} {import_time(EAGER_IMPORTS, cwd=here):8.1f} ms")
+
+    first, rerun = first_render(db_path)
+    print(f"🖼️ first render {first * 1e3:.0f} ms, rerun {rerun * 1e3:.0f} ms")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
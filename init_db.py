@@ -1,19 +1,18 @@
-import streamlit as st
-import pandas as pd
-import os
-import re
-
 import sqlite3
 
 # Connect or create the SQLite database
 DB_PATH='lab_inventory.db'
+# bump when init_db() learns a new table/trigger/index
+SCHEMA_VERSION = 4
+_schema_checked = set()
 
 def get_connection():
     conn = sqlite3.connect(DB_PATH,check_same_thread=False)
     conn.execute("PRAGMA foreign_keys=ON")
     return conn
 
-def init_db(conn):
+def init_db(conn, rebuild_fact=False):
+    """Create any missing tables. Nothing is dropped unless *rebuild_fact*."""
     # Table 1: CHRONECT data
     cursor = conn.cursor()
 
@@ -51,10 +50,13 @@ def init_db(conn):
     SourceFile TEXT
     )
     """)
+    # rack reconciliation looks vials up by rack
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_hamilton_rack ON hamilton_data(RackID)")
 
     # Table 3: Fact Table (master status + link)
-    # --- Drop existing inventory_fact table ---
-    cursor.execute("DROP TABLE IF EXISTS inventory_fact")
+    # --- Drop existing inventory_fact table (explicit rebuilds only) ---
+    if rebuild_fact:
+        cursor.execute("DROP TABLE IF EXISTS inventory_fact")
     # Recreate inventory_fact table with correct structure
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS inventory_fact (
@@ -66,10 +68,112 @@ def init_db(conn):
     FOREIGN KEY (Barcode) REFERENCES SubstanceName
     )
     """)
+    create_write_log(cursor)
+    create_ingest_journal(cursor)
+    create_archived_barcodes(cursor)
     print("✅ Database and all 3 tables created.")
     conn.commit()
 
+def ensure_schema(conn):
+    """Bring the schema up to SCHEMA_VERSION, at most once per process per file.
+
+    The probe is a single PRAGMA user_version read; when it is already current
+    no DDL runs at all.
+    """
+    db_file = next(r[2] for r in conn.execute("PRAGMA database_list") if r[1] == "main")
+    if db_file and db_file in _schema_checked:
+        return
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < SCHEMA_VERSION:
+        init_db(conn)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    _schema_checked.add(db_file)
+
+def create_write_log(cursor):
+    """Create the write_log table and the triggers that feed it.
+
+    Every insert, update or delete on inventory_fact / hamilton_data appends
+    the touched Barcode here, so in-memory caches (see barcode_index.py) can
+    refresh only what changed since their last sequence number. Consumers
+    prune the rows they have applied, so the table stays short.
+    """
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS write_log (
+    Seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    Barcode TEXT,
+    TableName TEXT,
+    Op TEXT
+    )
+    """)
+    for table in ("inventory_fact", "hamilton_data"):
+        for op, ref in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_{op.lower()}_log
+            AFTER {op} ON {table}
+            BEGIN
+                INSERT INTO write_log (Barcode, TableName, Op)
+                VALUES ({ref}.Barcode, '{table}', '{op}');
+            END
+            """)
+
+INGEST_JOURNAL_DDL = """
+    CREATE TABLE IF NOT EXISTS ingest_journal (
+    SourceFile TEXT NOT NULL,
+    SourcePath TEXT,
+    FileChecksum TEXT NOT NULL,
+    RowStart INTEGER,
+    RowEnd INTEGER,
+    TotalRows INTEGER,
+    Checksum TEXT,
+    Status TEXT,
+    Error TEXT,
+    UpdatedAt TEXT DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (SourceFile, FileChecksum, RowStart)
+    )
+"""
+
+def create_ingest_journal(cursor):
+    """Create the ingest_journal table used by load_chronect.
+
+    One row per batch of a CHRONECT file: which rows it covered, a checksum
+    of their content and whether the batch made it in ('pending', 'done' or
+    'failed'). A batch left 'pending' means the loader crashed mid-file.
+
+    SourceFile and FileChecksum are NOT NULL: SQLite treats NULLs in a
+    composite primary key as distinct, so a NULL there would duplicate rows.
+    Journals created before that rule are rebuilt without their NULL rows.
+    """
+    cols = cursor.execute("PRAGMA table_info(ingest_journal)").fetchall()
+    nullable = {c[1] for c in cols if not c[3]}
+    if {"SourceFile", "FileChecksum"} & nullable:
+        cursor.execute("ALTER TABLE ingest_journal RENAME TO ingest_journal_old")
+        cursor.execute(INGEST_JOURNAL_DDL)
+        cursor.execute("""
+        INSERT OR IGNORE INTO ingest_journal
+        SELECT * FROM ingest_journal_old
+        WHERE SourceFile IS NOT NULL AND FileChecksum IS NOT NULL
+        """)
+        cursor.execute("DROP TABLE ingest_journal_old")
+    else:
+        cursor.execute(INGEST_JOURNAL_DDL)
+
+def create_archived_barcodes(cursor):
+    """Create the archived_barcodes tombstone table.
+
+    archive.py records every barcode it moves to the cold tier here. Ingest
+    skips these barcodes, so replaying an old CHRONECT file cannot bring an
+    archived vial back as 'Ready'.
+    """
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS archived_barcodes (
+    Barcode TEXT PRIMARY KEY,
+    ArchivedAt TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
 if __name__ == '__main__':
+    import sys
     conn = get_connection()
-    init_db(conn)
+    init_db(conn, rebuild_fact="--rebuild-fact" in sys.argv)
     conn.close()
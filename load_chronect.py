@@ -3,11 +3,11 @@ import re
 import pandas as pd
 import sqlite3
 import streamlit as st
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
-import dropbox
-from dropbox.exceptions import ApiError
 import io
+import sys
+import hashlib
+
+from init_db import create_write_log, create_ingest_journal, create_archived_barcodes
 
 DB_PATH    = st.secrets["database"]["STREAMLIT_DB"]
 DBX_TOKEN  = st.secrets["dropbox"]["DBX_TOKEN"]
@@ -47,6 +47,9 @@ def init_db():
       Source TEXT,
       FOREIGN KEY(Barcode) REFERENCES chronect_data(Barcode)
     )""")
+    create_write_log(c)
+    create_ingest_journal(c)
+    create_archived_barcodes(c)
     conn.commit()
     conn.close()
 
@@ -80,81 +83,248 @@ def normalize_columns(df, source_file):
     df["SourceFile"] = os.path.basename(source_file)
     return df
 
-def insert_into_database(df, conn=None):
-    """Insert CHRONECT dataframe rows into the database.
+CHRONECT_COLS = [
+  "Barcode","Tray","Vial","VialPosition","SampleID","UserID",
+  "SubstanceName","Head","LotID","TargetWeight","ActualWeight",
+  "Outcome","DeviationPercent","Date","Time","DispenseDuration",
+  "ErrorMessage","StableWeight","Timestamp","SourceFile"
+]
+BATCH_SIZE = 500
+
+def file_checksum(data):
+    return hashlib.sha256(data).hexdigest()
+
+def batch_checksum(batch):
+    """Checksum of a batch's content, independent of its row index."""
+    hashed = pd.util.hash_pandas_object(batch.astype(str), index=False)
+    return hashlib.sha256(hashed.values.tobytes()).hexdigest()
+
+def _journal(c, source_file, source_path, checksum_of_file, start, end, total,
+             checksum, status, error=None):
+    c.execute("""
+      INSERT OR REPLACE INTO ingest_journal
+        (SourceFile, SourcePath, FileChecksum, RowStart, RowEnd, TotalRows,
+         Checksum, Status, Error, UpdatedAt)
+      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    """, (source_file, source_path, checksum_of_file, start, end, total,
+          checksum, status, error))
+
+def is_file_ingested(conn, source_file, checksum_of_file):
+    """True if every row of this exact file version is journaled as done."""
+    done, total = conn.execute("""
+      SELECT COALESCE(SUM(RowEnd - RowStart), 0), MAX(TotalRows)
+      FROM ingest_journal
+      WHERE SourceFile = ? AND FileChecksum = ? AND Status = 'done'
+    """, (source_file, checksum_of_file)).fetchone()
+    return total is not None and done >= total
+
+def insert_into_database(df, conn=None, source_path=None, checksum_of_file=None,
+                         batch_size=BATCH_SIZE, source_file=None):
+    """Insert CHRONECT dataframe rows into the database, journaled per batch.
+
+    Each batch of *batch_size* rows is written in its own transaction and
+    recorded in ingest_journal ('pending' up front, 'done' or 'failed' after).
+    Batches already journaled as done with the same checksum are skipped, and
+    rows go in with INSERT OR IGNORE on Barcode, so replaying a file only
+    writes what did not make it in last time. Barcodes listed in
+    archived_barcodes are skipped.
 
-    If *conn* is provided the existing connection is used, otherwise a new
-    connection is created for the duration of this call.
+    The journal names the file *source_file*, falling back to the basename
+    of *source_path* and then to the rows' SourceFile column. When
+    *checksum_of_file* is not given, a checksum of the whole frame is used in
+    its place.
+
+    If *conn* is provided the existing connection is used (and left open),
+    otherwise a new connection is created for the duration of this call.
+    A failing batch is journaled and the exception re-raised.
     """
     close_conn = False
     if conn is None:
         conn = get_connection()
         close_conn = True
 
+    rows = df.reindex(columns=CHRONECT_COLS).astype(object)
+    rows = rows.where(rows.notna(), None)
+    if source_file is None and source_path:
+        source_file = os.path.basename(source_path)
+    if source_file is None and len(rows):
+        source_file = rows["SourceFile"].iloc[0]
+    if source_file is None:
+        raise ValueError("❌ insert_into_database needs source_file or source_path to journal the ingest.")
+    total = len(rows)
+    if checksum_of_file is None:
+        # NULLs never collide in the journal's primary key, so derive one
+        checksum_of_file = batch_checksum(rows)
+    placeholders = ",".join("?"*len(CHRONECT_COLS))
     c = conn.cursor()
-    chronect_cols = [
-      "Barcode","Tray","Vial","VialPosition","SampleID","UserID",
-      "SubstanceName","Head","LotID","TargetWeight","ActualWeight",
-      "Outcome","DeviationPercent","Date","Time","DispenseDuration",
-      "ErrorMessage","StableWeight","Timestamp","SourceFile"
-    ]
-    for _, row in df.iterrows():
-        try:
-            # chronect_data
-            placeholders = ",".join("?"*len(chronect_cols))
-            c.execute(f"""
-              INSERT OR IGNORE INTO chronect_data ({','.join(chronect_cols)})
-              VALUES ({placeholders})
-            """, [row.get(cn) for cn in chronect_cols])
-            # inventory_fact
-            c.execute("""
-              INSERT OR IGNORE INTO inventory_fact (Barcode,Status,Source)
-              VALUES (?, 'Ready', 'CHRONECT')
-            """, (row["Barcode"],))
-        except Exception as e:
-            print("❌", row["Barcode"], e)
-    conn.commit()
-    conn.close()
+    try:
+        if total == 0:
+            _journal(c, source_file, source_path, checksum_of_file, 0, 0, 0, None, "done")
+            conn.commit()
+        # plan: journal every unfinished batch as pending before writing any,
+        # so a crash anywhere below leaves a record of what is left to do
+        todo = []
+        for start in range(0, total, batch_size):
+            batch = rows.iloc[start:start + batch_size]
+            end = start + len(batch)
+            checksum = batch_checksum(batch)
+            prev = c.execute("""
+              SELECT Checksum, Status FROM ingest_journal
+              WHERE SourceFile = ? AND FileChecksum IS ? AND RowStart = ?
+            """, (source_file, checksum_of_file, start)).fetchone()
+            if prev == (checksum, "done"):
+                continue
+            _journal(c, source_file, source_path, checksum_of_file, start, end,
+                     total, checksum, "pending")
+            todo.append((start, end, batch, checksum))
+        conn.commit()
+
+        for start, end, batch, checksum in todo:
+            # never resurrect vials that archive.py moved to the cold tier
+            barcodes = [bc for bc in batch["Barcode"] if bc is not None]
+            archived = {r[0] for r in c.execute(
+                f"SELECT Barcode FROM archived_barcodes WHERE Barcode IN ({','.join('?'*len(barcodes))})",
+                barcodes
+            )} if barcodes else set()
+            if archived:
+                batch = batch[~batch["Barcode"].isin(archived)]
+            try:
+                c.executemany(f"""
+                  INSERT OR IGNORE INTO chronect_data ({','.join(CHRONECT_COLS)})
+                  VALUES ({placeholders})
+                """, batch.itertuples(index=False, name=None))
+                c.executemany("""
+                  INSERT OR IGNORE INTO inventory_fact (Barcode,Status,Source)
+                  VALUES (?, 'Ready', 'CHRONECT')
+                """, [(bc,) for bc in batch["Barcode"] if bc is not None])
+                _journal(c, source_file, source_path, checksum_of_file, start, end,
+                         total, checksum, "done")
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                _journal(c, source_file, source_path, checksum_of_file, start, end,
+                         total, checksum, "failed", str(e))
+                conn.commit()
+                print("❌", source_file, f"rows {start}-{end}", e)
+                raise
+        # unfinished batches of an older version of this file are moot now,
+        # and NULL-checksum rows (any status) only ever duplicate themselves
+        c.execute("""
+          DELETE FROM ingest_journal
+          WHERE SourceFile = ?
+            AND (FileChecksum IS NULL
+                 OR (FileChecksum IS NOT ? AND Status <> 'done'))
+        """, (source_file, checksum_of_file))
+        conn.commit()
+    finally:
+        if close_conn:
+            conn.close()
+
+def list_chronect_entries(dbx):
+    """All CHRONECT .xlsx entries in the Dropbox INPUT_DIR, following pagination."""
+    res = dbx.files_list_folder(INPUT_DIR)
+    entries = list(res.entries)
+    while res.has_more:
+        res = dbx.files_list_folder_continue(res.cursor)
+        entries += res.entries
+    return [e for e in entries if re.match(r".*_\d{8}_\d{6}\.xlsx$", e.name)]
+
+def load_dropbox_file(dbx, entry, conn=None):
+    md, resp = dbx.files_download(entry.path_lower)
+    df = pd.read_excel(io.BytesIO(resp.content), engine="openpyxl")
+    df = normalize_columns(df, entry.name)
+    insert_into_database(df, conn, source_path=entry.path_lower, source_file=entry.name,
+                         checksum_of_file=entry.content_hash)
 
 def load_all_chronect_files():
+    # dropbox is slow to import; only pay for it when we actually sync
+    import dropbox
+    from dropbox.exceptions import ApiError
     dbx = dropbox.Dropbox(DBX_TOKEN)
     try:
         # list all .xlsx in that Dropbox folder
-        res = dbx.files_list_folder(INPUT_DIR)
+        entries = list_chronect_entries(dbx)
 
     except ApiError as e:
         # give a helpful message when the folder does not exist
         if isinstance(e.error, dropbox.files.ListFolderError):
             lf_err = e.error
             if lf_err.is_path() and lf_err.get_path().is_not_found():
-                print(f"❌ Dropbox folder {DBX_INPUT} not found. Check INPUT_DIR in Streamlit secrets.")
+                print(f"❌ Dropbox folder {INPUT_DIR} not found. Check INPUT_DIR in Streamlit secrets.")
                 return
         print("❌ Dropbox API error:", e)
+        return
 
-    for entry in res.entries:
-        if re.match(r".*_\d{8}_\d{6}\.xlsx$", entry.name):
+    conn = get_connection()
+    try:
+        for entry in entries:
+            # content_hash comes with the listing, so finished files are
+            # skipped without downloading them
+            if is_file_ingested(conn, entry.name, entry.content_hash):
+                continue
             print("📥 Loading", entry.name)
-            md, resp = dbx.files_download(entry.path_lower)
-            df = pd.read_excel(io.BytesIO(resp.content), engine="openpyxl")
-            df = normalize_columns(df, entry.name)
-            insert_into_database(df)
+            try:
+                load_dropbox_file(dbx, entry, conn)
+            except Exception as e:
+                print("❌ Failed to ingest", entry.name, e)
+    finally:
+        conn.close()
 
 def load_one_chronect_file(path):
     print("🔔 Detected new file:", path)
     try:
-        df = pd.read_excel(path, engine="openpyxl")
-        df = normalize_columns(df, path)
-        insert_into_database(df)
+        with open(path, "rb") as f:
+            data = f.read()
+        checksum_of_file = file_checksum(data)
+        conn = get_connection()
+        try:
+            if is_file_ingested(conn, os.path.basename(path), checksum_of_file):
+                print("⏭️", os.path.basename(path), "already ingested.")
+                return
+            df = pd.read_excel(io.BytesIO(data), engine="openpyxl")
+            df = normalize_columns(df, path)
+            insert_into_database(df, conn, source_path=path, source_file=os.path.basename(path),
+                                 checksum_of_file=checksum_of_file)
+        finally:
+            conn.close()
         print("✅", os.path.basename(path), "ingested.")
     except Exception as e:
         print("❌ Failed to ingest", path, e)
 
-# ------------------ Watchdog ------------------
+def recover_interrupted_ingests():
+    """Re-run every file with a batch journaled as 'pending' or 'failed'.
+
+    Finished batches are skipped by checksum, so only the unfinished rows are
+    written again. Local paths are re-read from disk, anything else is
+    downloaded from Dropbox.
+    """
+    conn = get_connection()
+    pending = conn.execute("""
+      SELECT DISTINCT SourceFile, SourcePath FROM ingest_journal
+      WHERE Status <> 'done'
+    """).fetchall()
+    conn.close()
+    if not pending:
+        print("✅ No interrupted ingests.")
+        return
 
-class ChronectHandler(FileSystemEventHandler):
-    def on_created(self, event):
-        if not event.is_directory and event.src_path.endswith(".xlsx"):
-            load_one_chronect_file(event.src_path)
+    dbx = None
+    for source_file, source_path in pending:
+        print("🔁 Resuming", source_file)
+        if source_path and os.path.isfile(source_path):
+            load_one_chronect_file(source_path)
+            continue
+        try:
+            if dbx is None:
+                import dropbox
+                dbx = dropbox.Dropbox(DBX_TOKEN)
+            entry = dbx.files_get_metadata(source_path)
+            load_dropbox_file(dbx, entry)
+            print("✅", source_file, "ingested.")
+        except Exception as e:
+            print("❌ Failed to resume", source_file, e)
+
+# ------------------ Watchdog ------------------
 
 def start_chronect_watcher():
     """Start a watchdog observer on INPUT_DIR if the folder exists."""
@@ -162,15 +332,27 @@ def start_chronect_watcher():
         print(f"❌ Local folder {INPUT_DIR} does not exist. Watcher disabled.")
         return
 
-    observer = Observer()
-    observer.schedule(ChronectHandler(), INPUT_DIR, recursive=False)
-    observer.daemon = True
-    observer.start()
-    print("🔍 Watching", INPUT_DIR, "for new CHRONECT files…")
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+
+    class ChronectHandler(FileSystemEventHandler):
+        def on_created(self, event):
+            if not event.is_directory and event.src_path.endswith(".xlsx"):
+                load_one_chronect_file(event.src_path)
+
     try:
+        observer = Observer()
         observer.schedule(ChronectHandler(), INPUT_DIR, recursive=False)
         observer.daemon = True
         observer.start()
         print("🔍 Watching", INPUT_DIR, "for new CHRONECT files…")
+        return observer
     except (FileNotFoundError, OSError) as e:
-        print("❌ Failed to start watcher:", e)
\ No newline at end of file
+        print("❌ Failed to start watcher:", e)
+
+if __name__ == "__main__":
+    init_db()
+    if sys.argv[1:] == ["recover"]:
+        recover_interrupted_ingests()
+    else:
+        load_all_chronect_files()
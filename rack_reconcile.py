@@ -0,0 +1,207 @@
+import os
+import re
+import pandas as pd
+
+ROWS = "ABCDEFGH"
+# what rack scanners write into a well with no readable tube
+EMPTY_WELL = {"", "NO READ", "NOREAD", "NO TUBE", "NOTUBE", "EMPTY", "NAN", "NONE"}
+RACK_FILE_RE = re.compile(r"rack_(\d+)", re.IGNORECASE)
+WELL_RE = re.compile(r"^([A-Ha-h])\s*0*(\d{1,2})$")
+
+RECONCILE_SQL = """
+SELECT * FROM (
+WITH dup AS (
+    SELECT Barcode FROM temp.rack_scan GROUP BY Barcode HAVING COUNT(*) > 1
+)
+SELECT s.Barcode,
+       s.RackID AS ScanRack, s.Row AS ScanRow, s.Column AS ScanColumn,
+       hd.RackID AS RecordedRack, hd.Row AS RecordedRow, hd.Column AS RecordedColumn,
+       inv.Status,
+       CASE
+         WHEN dup.Barcode IS NOT NULL THEN 'duplicate'
+         WHEN hd.Barcode IS NULL THEN 'unknown'
+         WHEN hd.RackID = s.RackID AND hd.Row = s.Row AND hd.Column = s.Column THEN 'ok'
+         ELSE 'misplaced'
+       END AS Issue
+FROM temp.rack_scan s
+LEFT JOIN hamilton_data hd ON hd.Barcode = s.Barcode
+LEFT JOIN inventory_fact inv ON inv.Barcode = s.Barcode
+LEFT JOIN dup ON dup.Barcode = s.Barcode
+UNION ALL
+SELECT hd.Barcode,
+       NULL, NULL, NULL,
+       hd.RackID, hd.Row, hd.Column,
+       inv.Status,
+       'missing'
+FROM hamilton_data hd
+LEFT JOIN inventory_fact inv ON inv.Barcode = hd.Barcode
+WHERE hd.RackID IN (SELECT RackID FROM temp.audited_racks)
+  AND COALESCE(inv.Status, '') <> 'Completed'
+  AND NOT EXISTS (SELECT 1 FROM temp.rack_scan s WHERE s.Barcode = hd.Barcode)
+)
+ORDER BY COALESCE(ScanRack, RecordedRack), COALESCE(ScanRow, RecordedRow),
+         COALESCE(ScanColumn, RecordedColumn)
+"""
+
+
+def _pick(df, *names):
+    for name in names:
+        if name in df.columns:
+            return name
+    return None
+
+
+def normalize_scan(df, rack_id=None):
+    """Normalize a rack-scanner export to Barcode, RackID, Row, Column.
+
+    Accepts either a single well column ("Position"/"Well", e.g. A1 or A01)
+    or separate Row and Column columns. If the export has no rack column,
+    *rack_id* is used for every row. Empty wells are kept with a null
+    Barcode so a rack that scanned completely empty still counts as audited.
+    """
+    df = df.copy()
+    df.columns = df.columns.str.strip()
+
+    bc_col = _pick(df, "Barcode", "Chronect Barcode", "Tube Barcode", "TubeBarcode")
+    if bc_col is None:
+        raise ValueError(f"❌ No barcode column in scan export: {list(df.columns)}")
+    out = pd.DataFrame({"Barcode": df[bc_col].astype(str).str.strip()})
+
+    # only numeric RackIDs are understood; rack barcodes are not mapped
+    rack_col = _pick(df, "RackID", "Rack ID", "Rack")
+    if rack_col is not None:
+        out["RackID"] = pd.to_numeric(df[rack_col], errors="coerce")
+        if out.RackID.isna().any():
+            raise ValueError(
+                f"❌ Rack column '{rack_col}' must hold numeric RackIDs, got e.g. "
+                f"{df.loc[out.RackID.isna(), rack_col].iloc[0]!r}"
+            )
+    elif rack_id is not None:
+        out["RackID"] = int(rack_id)
+    else:
+        raise ValueError("❌ Scan export has no rack column and no rack_id was given.")
+
+    well_col = _pick(df, "Position", "Well", "Location")
+    if well_col is not None:
+        wells = df[well_col].astype(str).str.strip().str.extract(WELL_RE)
+        out["Row"] = wells[0].str.upper()
+        out["Column"] = pd.to_numeric(wells[1], errors="coerce")
+    elif "Row" in df.columns and "Column" in df.columns:
+        out["Row"] = df["Row"].astype(str).str.strip().str.upper()
+        out["Column"] = pd.to_numeric(df["Column"], errors="coerce")
+    else:
+        raise ValueError(
+            "❌ Scan export needs a Position/Well/Location column or Row and Column "
+            f"columns: {list(df.columns)}"
+        )
+
+    empty = out.Barcode.str.upper().isin(EMPTY_WELL)
+    out.loc[empty, "Barcode"] = None
+    bad = out[out.RackID.isna() | (~empty & (out.Column.isna() | ~out.Row.isin(list(ROWS))))]
+    if not bad.empty:
+        raise ValueError(f"❌ {len(bad)} scan rows have no valid rack/well, e.g. {bad.iloc[0].to_dict()}")
+    return out.astype({"RackID": int}).reset_index(drop=True)
+
+
+def read_scan_exports(files):
+    """Read and normalize one or many scanner CSV exports.
+
+    *files* may be paths or uploaded file objects. When a file has no rack
+    column the rack id is taken from its name (e.g. ``rack_12.csv``).
+    """
+    frames = []
+    for f in files:
+        name = os.path.basename(getattr(f, "name", str(f)))
+        m = RACK_FILE_RE.search(name)
+        df = pd.read_csv(f)
+        frames.append(normalize_scan(df, rack_id=int(m.group(1)) if m else None))
+    if not frames:
+        return pd.DataFrame(columns=["Barcode", "RackID", "Row", "Column"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def reconcile(conn, scan_df):
+    """Diff scanned rack layouts against hamilton_data in one query.
+
+    Returns one row per scanned tube (Issue = ok / misplaced / unknown /
+    duplicate) plus one row per recorded, not-Completed vial on an audited
+    rack that was not scanned anywhere (Issue = missing). Every RackID in
+    *scan_df* is audited, including racks whose wells were all empty.
+    """
+    cur = conn.cursor()
+    cur.execute("DROP TABLE IF EXISTS temp.rack_scan")
+    cur.execute("DROP TABLE IF EXISTS temp.audited_racks")
+    cur.execute("CREATE TEMP TABLE audited_racks (RackID INTEGER PRIMARY KEY)")
+    cur.executemany(
+        "INSERT INTO temp.audited_racks (RackID) VALUES (?)",
+        [(int(r),) for r in scan_df.RackID.unique()]
+    )
+    tubes = scan_df[scan_df.Barcode.notna()]
+    cur.execute("""
+    CREATE TEMP TABLE rack_scan (
+    Barcode TEXT,
+    RackID INTEGER,
+    Row TEXT,
+    Column INTEGER
+    )
+    """)
+    cur.executemany(
+        "INSERT INTO temp.rack_scan (Barcode, RackID, Row, Column) VALUES (?, ?, ?, ?)",
+        [(bc, int(rack), row, int(col))
+         for bc, rack, row, col in tubes[["Barcode", "RackID", "Row", "Column"]].itertuples(index=False, name=None)]
+    )
+    cur.execute("CREATE INDEX temp.idx_rack_scan_barcode ON rack_scan(Barcode)")
+    cur.execute("CREATE INDEX temp.idx_rack_scan_rack ON rack_scan(RackID)")
+    report = pd.read_sql(RECONCILE_SQL, conn)
+    cur.execute("DROP TABLE temp.rack_scan")
+    cur.execute("DROP TABLE temp.audited_racks")
+    conn.commit()
+    return report
+
+
+def summarize(report):
+    """Count of each Issue per scanned/recorded rack."""
+    rack = report.ScanRack.fillna(report.RecordedRack).astype(int)
+    return (
+        report.assign(RackID=rack)
+        .pivot_table(index="RackID", columns="Issue", values="Barcode", aggfunc="count", fill_value=0)
+        .reset_index()
+    )
+
+
+def apply_corrections(conn, report, remove_missing=False):
+    """Make hamilton_data match the scan, in a single transaction.
+
+    - misplaced: move the recorded position to the scanned well
+    - unknown (but in inventory_fact): record the scanned position and mark
+      the vial "In Fridge"
+    - missing: deleted from hamilton_data only if *remove_missing*
+
+    Duplicates and barcodes unknown to inventory_fact are left for a human.
+    Returns a dict of how many rows were corrected per Issue.
+    """
+    moved = report[report.Issue == "misplaced"]
+    added = report[(report.Issue == "unknown") & report.Status.notna()]
+    missing = report[report.Issue == "missing"] if remove_missing else report.iloc[0:0]
+
+    with conn:
+        conn.executemany(
+            "UPDATE hamilton_data SET RackID = ?, Row = ?, Column = ? WHERE Barcode = ?",
+            [(int(r.ScanRack), r.ScanRow, int(r.ScanColumn), r.Barcode) for r in moved.itertuples()]
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO hamilton_data (Barcode, RackID, Row, Column, SourceFile) "
+            "VALUES (?, ?, ?, ?, 'rack scan')",
+            [(r.Barcode, int(r.ScanRack), r.ScanRow, int(r.ScanColumn)) for r in added.itertuples()]
+        )
+        conn.executemany(
+            "UPDATE inventory_fact SET Status = 'In Fridge' WHERE Barcode = ?",
+            [(bc,) for bc in added.Barcode]
+        )
+        conn.executemany(
+            "DELETE FROM hamilton_data WHERE Barcode = ?",
+            [(bc,) for bc in missing.Barcode]
+        )
+    counts = {"misplaced": len(moved), "unknown": len(added), "missing": len(missing)}
+    print(f"✅ Rack corrections applied: {counts}")
+    return counts